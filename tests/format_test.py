@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 """Unit test for prompt engineering strategies in format function."""
 import unittest
+from types import MappingProxyType
+from typing import Any, Mapping
 from unittest.mock import MagicMock, patch
 
 from agentscope.message import Msg
 from agentscope.models import (
+    ModelWrapperBase,
     OpenAIChatWrapper,
     OllamaChatWrapper,
     OllamaGenerationWrapper,
@@ -14,321 +17,208 @@ from agentscope.models import (
     DashScopeMultiModalWrapper,
 )
 
+# Stand-ins for the api clients created in the wrapper constructors
+_DUMMY_MOCK = MagicMock(return_value="client_dummy")
+_DUMMY_MOCK_CONFIGURE = MagicMock(return_value="client_dummy")
 
-class ExampleTest(unittest.TestCase):
-    """
-    ExampleTest for a unit test.
-    """
+# Inputs and ground truths are shared by all the tests, so we build them
+# once when the module is loaded.
+_SYS_MSG = Msg("system", "You are a helpful assistant", role="system")
+_USER_MSG = Msg("user", "What is the weather today?", role="user")
+_ASSISTANT_MSG = Msg("assistant", "It is sunny today", role="assistant")
 
-    def setUp(self) -> None:
-        """Init for ExampleTest."""
-        self.inputs = [
-            Msg("system", "You are a helpful assistant", role="system"),
-            [
-                Msg("user", "What is the weather today?", role="user"),
-                Msg("assistant", "It is sunny today", role="assistant"),
-            ],
-        ]
+_HISTORY = [_USER_MSG, _ASSISTANT_MSG]
 
-        self.wrong_inputs = [
-            Msg("system", "You are a helpful assistant", role="system"),
-            [
-                "What is the weather today?",
-                Msg("assistant", "It is sunny today", role="assistant"),
-            ],
-        ]
+_WRONG_HISTORY = ["What is the weather today?", _ASSISTANT_MSG]
 
-    @patch("openai.OpenAI")
-    def test_openai_chat(self, mock_client: MagicMock) -> None:
-        """Unit test for the format function in openai chat api wrapper."""
-        # Prepare the mock client
-        mock_client.return_value = "client_dummy"
+_DIALOGUE_HISTORY_TEXT = (
+    "## Dialogue History\n"
+    "user: What is the weather today?\n"
+    "assistant: It is sunny today"
+)
 
-        model = OpenAIChatWrapper(
-            config_name="",
-            model_name="gpt-4",
-        )
+_SYS_PREFIXED_HISTORY = (
+    "You are a helpful assistant\n\n" + _DIALOGUE_HISTORY_TEXT
+)
 
-        # correct format
-        ground_truth = [
-            {
-                "role": "system",
-                "content": "You are a helpful assistant",
-                "name": "system",
-            },
-            {
-                "role": "user",
-                "content": "What is the weather today?",
-                "name": "user",
-            },
-            {
-                "role": "assistant",
-                "content": "It is sunny today",
-                "name": "assistant",
-            },
-        ]
 
-        prompt = model.format(*self.inputs)  # type: ignore[arg-type]
-        self.assertListEqual(prompt, ground_truth)
+def _prompt_msg(role: str, content: Any, **extra: Any) -> Mapping:
+    """Build a read-only message dict in the format expected by the model
+    APIs."""
+    return MappingProxyType({"role": role, "content": content, **extra})
 
-        # wrong format
-        with self.assertRaises(TypeError):
-            model.format(*self.wrong_inputs)  # type: ignore[arg-type]
 
-    def test_ollama_chat(self) -> None:
-        """Unit test for the format function in ollama chat api wrapper."""
-        model = OllamaChatWrapper(
-            config_name="",
-            model_name="llama2",
-        )
+_GT_OPENAI = (
+    _prompt_msg("system", "You are a helpful assistant", name="system"),
+    _prompt_msg("user", "What is the weather today?", name="user"),
+    _prompt_msg("assistant", "It is sunny today", name="assistant"),
+)
 
-        # correct format
-        ground_truth = [
-            {"role": "system", "content": "You are a helpful assistant"},
-            {"role": "user", "content": "What is the weather today?"},
-            {"role": "assistant", "content": "It is sunny today"},
-        ]
-        prompt = model.format(*self.inputs)  # type: ignore[arg-type]
-        self.assertEqual(prompt, ground_truth)
+_GT_OLLAMA_CHAT = (
+    _prompt_msg("system", "You are a helpful assistant"),
+    _prompt_msg("user", "What is the weather today?"),
+    _prompt_msg("assistant", "It is sunny today"),
+)
 
-        # wrong format
-        with self.assertRaises(TypeError):
-            model.format(*self.wrong_inputs)  # type: ignore[arg-type]
+_GT_GEMINI = (
+    MappingProxyType({"role": "user", "parts": [_SYS_PREFIXED_HISTORY]}),
+)
 
-    def test_ollama_generation(self) -> None:
-        """Unit test for the generation function in ollama chat api wrapper."""
-        model = OllamaGenerationWrapper(
-            config_name="",
-            model_name="llama2",
-        )
+_GT_DIALOGUE_HISTORY_SYSTEM_USER = (
+    _prompt_msg("system", "You are a helpful assistant"),
+    _prompt_msg("user", _DIALOGUE_HISTORY_TEXT),
+)
 
-        # correct format
-        ground_truth = (
-            "You are a helpful assistant\n\n## Dialogue History\nuser: "
-            "What is the weather today?\nassistant: It is sunny today"
-        )
-        prompt = model.format(*self.inputs)  # type: ignore[arg-type]
-        self.assertEqual(prompt, ground_truth)
 
-        # wrong format
-        with self.assertRaises(TypeError):
-            model.format(*self.wrong_inputs)  # type: ignore[arg-type]
+def _mm_case(media_key: str, ext: str) -> tuple:
+    """Build the inputs and ground truth of the dashscope multimodal
+    format test for the given media type."""
+    urls = [f"url{i}.{ext}" for i in (1, 2, 3)]
+    sys_msg = Msg(
+        "system",
+        "You are a helpful assistant",
+        role="system",
+        url=urls[0],
+    )
+    history = [
+        Msg(
+            "user",
+            "What is the weather today?",
+            role="user",
+            url=urls[1],
+        ),
+        Msg(
+            "assistant",
+            "It is sunny today",
+            role="assistant",
+            url=urls[2],
+        ),
+    ]
+    ground_truth = (
+        _prompt_msg(
+            "system",
+            [{media_key: urls[0]}, {"text": "You are a helpful assistant"}],
+        ),
+        _prompt_msg(
+            "user",
+            [{media_key: url} for url in urls[1:]]
+            + [{"text": _DIALOGUE_HISTORY_TEXT}],
+        ),
+    )
+    return media_key, sys_msg, history, ground_truth
+
+
+_MM_CASES = (_mm_case("image", "png"), _mm_case("audio", "mp3"))
+
 
-    @patch("google.generativeai.configure")
-    def test_gemini_chat(self, mock_configure: MagicMock) -> None:
-        """Unit test for the format function in gemini chat api wrapper."""
-        mock_configure.return_value = "client_dummy"
+class ExampleTest(unittest.TestCase):
+    """
+    ExampleTest for a unit test.
+    """
 
-        model = GeminiChatWrapper(
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Build the model wrappers once for all the tests."""
+        for target, mock in (
+            ("openai.OpenAI", _DUMMY_MOCK),
+            ("google.generativeai.configure", _DUMMY_MOCK_CONFIGURE),
+        ):
+            patcher = patch(target, new=mock)
+            patcher.start()
+            cls.addClassCleanup(patcher.stop)
+
+        cls.openai_model = OpenAIChatWrapper(
+            config_name="",
+            model_name="gpt-4",
+        )
+        cls.ollama_chat_model = OllamaChatWrapper(
+            config_name="",
+            model_name="llama2",
+        )
+        cls.ollama_gen_model = OllamaGenerationWrapper(
+            config_name="",
+            model_name="llama2",
+        )
+        cls.gemini_model = GeminiChatWrapper(
             config_name="",
             model_name="gemini-pro",
             api_key="xxx",
         )
-
-        # correct format
-        ground_truth = [
-            {
-                "role": "user",
-                "parts": [
-                    "You are a helpful assistant\n\n## Dialogue History\n"
-                    "user: What is the weather today?\nassistant: It is "
-                    "sunny today",
-                ],
-            },
-        ]
-
-        prompt = model.format(*self.inputs)  # type: ignore[arg-type]
-        self.assertListEqual(prompt, ground_truth)
-
-        # wrong format
-        with self.assertRaises(TypeError):
-            model.format(*self.wrong_inputs)  # type: ignore[arg-type]
-
-    def test_dashscope_chat(self) -> None:
-        """Unit test for the format function in dashscope chat api wrapper."""
-        model = DashScopeChatWrapper(
+        cls.dashscope_model = DashScopeChatWrapper(
             config_name="",
             model_name="qwen-max",
             api_key="xxx",
         )
-
-        ground_truth = [
-            {
-                "content": "You are a helpful assistant",
-                "role": "system",
-            },
-            {
-                "content": (
-                    "## Dialogue History\n"
-                    "user: What is the weather today?\n"
-                    "assistant: It is sunny today"
-                ),
-                "role": "user",
-            },
-        ]
-
-        prompt = model.format(*self.inputs)
-        self.assertListEqual(prompt, ground_truth)
-
-        # wrong format
-        with self.assertRaises(TypeError):
-            model.format(*self.wrong_inputs)  # type: ignore[arg-type]
-
-    def test_zhipuai_chat(self) -> None:
-        """Unit test for the format function in zhipu chat api wrapper."""
-        model = ZhipuAIChatWrapper(
+        cls.zhipuai_model = ZhipuAIChatWrapper(
             config_name="",
             model_name="glm-4",
             api_key="xxx",
         )
-
-        ground_truth = [
-            {
-                "content": "You are a helpful assistant",
-                "role": "system",
-            },
-            {
-                "content": (
-                    "## Dialogue History\n"
-                    "user: What is the weather today?\n"
-                    "assistant: It is sunny today"
-                ),
-                "role": "user",
-            },
-        ]
-
-        prompt = model.format(*self.inputs)
-        self.assertListEqual(prompt, ground_truth)
-
-        # wrong format
-        with self.assertRaises(TypeError):
-            model.format(*self.wrong_inputs)  # type: ignore[arg-type]
-
-    def test_dashscope_multimodal_image(self) -> None:
-        """Unit test for the format function in dashscope multimodal
-        conversation api wrapper for image."""
-        model = DashScopeMultiModalWrapper(
+        cls.dashscope_mm_model = DashScopeMultiModalWrapper(
             config_name="",
             model_name="qwen-vl-plus",
             api_key="xxx",
         )
 
-        multimodal_input = [
-            Msg(
-                "system",
-                "You are a helpful assistant",
-                role="system",
-                url="url1.png",
-            ),
-            [
-                Msg(
-                    "user",
-                    "What is the weather today?",
-                    role="user",
-                    url="url2.png",
-                ),
-                Msg(
-                    "assistant",
-                    "It is sunny today",
-                    role="assistant",
-                    url="url3.png",
-                ),
-            ],
-        ]
-
-        ground_truth = [
-            {
-                "role": "system",
-                "content": [
-                    {"image": "url1.png"},
-                    {"text": "You are a helpful assistant"},
-                ],
-            },
-            {
-                "role": "user",
-                "content": [
-                    {"image": "url2.png"},
-                    {"image": "url3.png"},
-                    {
-                        "text": (
-                            "## Dialogue History\n"
-                            "user: What is the weather today?\n"
-                            "assistant: It is sunny today"
-                        ),
-                    },
-                ],
-            },
-        ]
-
-        prompt = model.format(*multimodal_input)
-        self.assertListEqual(prompt, ground_truth)
-
-        # wrong format
-        with self.assertRaises(TypeError):
-            model.format(*self.wrong_inputs)
+    def _assert_format(
+        self,
+        model: ModelWrapperBase,
+        ground_truth: Any,
+        sys_msg: Msg,
+        history: list,
+    ) -> None:
+        """Check the formatted prompt against the ground truth."""
+        self.assertEqual(model.format(sys_msg, history), ground_truth)
+
+    def test_format_matrix(self) -> None:
+        """Unit test for the format function in the chat and generation api
+        wrappers."""
+        cases = (
+            (self.openai_model, list(_GT_OPENAI)),
+            (self.ollama_chat_model, list(_GT_OLLAMA_CHAT)),
+            (self.ollama_gen_model, _SYS_PREFIXED_HISTORY),
+            (self.gemini_model, list(_GT_GEMINI)),
+            (self.dashscope_model, list(_GT_DIALOGUE_HISTORY_SYSTEM_USER)),
+            (self.zhipuai_model, list(_GT_DIALOGUE_HISTORY_SYSTEM_USER)),
+        )
+        for model, ground_truth in cases:
+            with self.subTest(cls=type(model).__name__):
+                self._assert_format(model, ground_truth, _SYS_MSG, _HISTORY)
 
-    def test_dashscope_multimodal_audio(self) -> None:
+    def test_dashscope_multimodal(self) -> None:
         """Unit test for the format function in dashscope multimodal
-        conversation api wrapper for audio."""
-        model = DashScopeMultiModalWrapper(
-            config_name="",
-            model_name="qwen-audio-turbo",
-            api_key="xxx",
+        conversation api wrapper for image and audio."""
+        model = self.dashscope_mm_model
+
+        for media_key, sys_msg, history, ground_truth in _MM_CASES:
+            with self.subTest(media=media_key):
+                self._assert_format(
+                    model,
+                    list(ground_truth),
+                    sys_msg,
+                    history,
+                )
+
+    def test_bad_inputs_raise_typeerror(self) -> None:
+        """Unit test for the format function with wrong inputs in all the
+        api wrappers."""
+        models = (
+            self.openai_model,
+            self.ollama_chat_model,
+            self.ollama_gen_model,
+            self.gemini_model,
+            self.dashscope_model,
+            self.zhipuai_model,
+            self.dashscope_mm_model,
         )
-
-        multimodal_input = [
-            Msg(
-                "system",
-                "You are a helpful assistant",
-                role="system",
-                url="url1.mp3",
-            ),
-            [
-                Msg(
-                    "user",
-                    "What is the weather today?",
-                    role="user",
-                    url="url2.mp3",
-                ),
-                Msg(
-                    "assistant",
-                    "It is sunny today",
-                    role="assistant",
-                    url="url3.mp3",
-                ),
-            ],
-        ]
-
-        ground_truth = [
-            {
-                "role": "system",
-                "content": [
-                    {"audio": "url1.mp3"},
-                    {"text": "You are a helpful assistant"},
-                ],
-            },
-            {
-                "role": "user",
-                "content": [
-                    {"audio": "url2.mp3"},
-                    {"audio": "url3.mp3"},
-                    {
-                        "text": (
-                            "## Dialogue History\n"
-                            "user: What is the weather today?\n"
-                            "assistant: It is sunny today"
-                        ),
-                    },
-                ],
-            },
-        ]
-
-        prompt = model.format(*multimodal_input)
-        self.assertListEqual(prompt, ground_truth)
-
-        # wrong format
-        with self.assertRaises(TypeError):
-            model.format(*self.wrong_inputs)
+        for model in models:
+            with self.subTest(model=type(model).__name__):
+                self.assertRaises(
+                    TypeError,
+                    model.format,
+                    _SYS_MSG,
+                    _WRONG_HISTORY,
+                )
 
 
 if __name__ == "__main__":